@@ -3,52 +3,93 @@ Application factory and core helpers for Rentalkuy.
 FULL-REPLACE: improved logging, error handling, and security.
 """
 import os
+import atexit
 import threading
 import smtplib
 import logging
 import importlib
+import importlib.util
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from base64 import b64encode
+from collections import deque
 from io import BytesIO
+from pathlib import Path
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 
-from flask import Flask, render_template
+from flask import Flask, current_app, g, render_template
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from flask_migrate import Migrate
 from flask_bcrypt import Bcrypt
 
 # ==========================================================
-# 0. Optional Libraries Handling (Safe Import)
+# 0. Optional Libraries Handling (Lazy Probe)
 # ==========================================================
-try:
-    from flask_talisman import Talisman
-    _HAS_TALISMAN = True
-except Exception:
-    Talisman = None
-    _HAS_TALISMAN = False
+def _probe_module(module_path):
+    """Cek ketersediaan module via metadata saja, tanpa eksekusi body-nya."""
+    try:
+        return importlib.util.find_spec(module_path) is not None
+    except Exception:
+        return False
+
+
+def _lazy_import(module_path):
+    """
+    Import module secara lazy via importlib.util.LazyLoader:
+    body module baru dieksekusi saat atribut pertama kali diakses.
+    Set env DISABLE_LAZY_IMPORTS=1 untuk kembali ke import eager
+    (berguna untuk test/tooling yang butuh module utuh).
+    """
+    if os.environ.get("DISABLE_LAZY_IMPORTS"):
+        return importlib.import_module(module_path)
+
+    if module_path in sys.modules:
+        return sys.modules[module_path]
 
+    spec = importlib.util.find_spec(module_path)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named '{module_path}'")
+    spec.loader = importlib.util.LazyLoader(spec.loader)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_path] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+# Talisman hanya dibutuhkan jika ENABLE_TALISMAN aktif → import di create_app
+_HAS_TALISMAN = _probe_module("flask_talisman")
+
+# flask_mail tetap eager: singleton `mail` dipakai module lain saat import
 try:
-    from flask_mail import Mail, Message
+    from flask_mail import Mail, Message, sanitize_address
     _HAS_FLASK_MAIL = True
 except Exception:
     Mail = None
     Message = None
+    sanitize_address = None
     _HAS_FLASK_MAIL = False
 
-try:
-    import pyotp
-    import qrcode
-    _HAS_PYOTP = True
-except Exception:
-    pyotp = None
-    qrcode = None
-    _HAS_PYOTP = False
+# orjson opsional: provider JSON C-level untuk jsonify/request.get_json
+_HAS_ORJSON = _probe_module("orjson")
+
+# pyotp/qrcode: cukup probe metadata; module di-load saat pertama dipakai
+pyotp = _lazy_import("pyotp") if _probe_module("pyotp") else None
+qrcode = _lazy_import("qrcode") if _probe_module("qrcode") else None
+
+# segno opsional: encoder QR lebih cepat dari qrcode+PIL (langsung ke PNG)
+segno = _lazy_import("segno") if _probe_module("segno") else None
 
 # ==========================================================
 # 1. Inisialisasi Extension (object only)
 # ==========================================================
-db = SQLAlchemy()
+# expire_on_commit=False: atribut tidak di-expire setelah commit, sehingga
+# komposisi email pasca-commit (approve/reject/dst membaca rental.borrower,
+# rental.items) tidak memicu badai SELECT refresh di transaksi baru.
+# Request web berumur pendek — data basi pasca-commit bukan masalah di sini.
+db = SQLAlchemy(session_options={"expire_on_commit": False})
 migrate = Migrate()
 login_manager = LoginManager()
 bcrypt = Bcrypt()
@@ -61,6 +102,56 @@ login_manager.login_message_category = "info"
 
 _logger = logging.getLogger(__name__)
 
+# ==========================================================
+# Registry Blueprint (deklaratif): (module, nama atribut, url_prefix).
+# Di-resolve sekali di create_app tanpa scan kandidat per module.
+# ==========================================================
+# ==========================================================
+# Error handlers di module scope: didefinisikan sekali, bukan
+# closure baru setiap create_app (hemat saat test membuat banyak app)
+# ==========================================================
+def _error_403(e):
+    pages = current_app.extensions.get("error_pages") or {}
+    return pages.get(403) or render_template("errors/403.html"), 403
+
+
+def _error_404(e):
+    pages = current_app.extensions.get("error_pages") or {}
+    return pages.get(404) or render_template("errors/404.html"), 404
+
+
+def _error_500(e):
+    pages = current_app.extensions.get("error_pages") or {}
+    return pages.get(500) or render_template("errors/500.html"), 500
+
+
+def _create_upload_dirs(app):
+    """Buat semua folder upload yang dikonfigurasi (idempotent, aman diulang)."""
+    upload_paths = list(app.config.get("UPLOAD_FOLDERS_TO_CREATE") or [])
+    if not upload_paths:
+        for key in ("UPLOAD_FOLDER_BASE", "UPLOAD_FOLDER_ITEMS", "UPLOAD_FOLDER_PAYMENT_PROOFS", "UPLOAD_FOLDER_PROFILE_PICS"):
+            p = app.config.get(key)
+            if p:
+                upload_paths.append(p)
+    try:
+        for p in upload_paths:
+            Path(p).mkdir(parents=True, exist_ok=True)
+    except Exception as e:
+        app.logger.error(f"Gagal menyiapkan folder upload: {e}")
+
+
+BLUEPRINT_REGISTRY = (
+    ("app.main.routes", "main_bp", None),
+    ("app.auth.routes", "auth_bp", "/auth"),
+    ("app.catalog.routes", "catalog_bp", "/catalog"),
+    ("app.cart.routes", "cart_bp", "/cart"),
+    ("app.booking.routes", "booking_bp", "/booking"),
+    ("app.admin.routes", "admin_bp", "/admin"),
+    ("app.account.routes", "account_bp", "/account"),
+    ("app.staff.routes", "staff_bp", "/staff"),
+    ("app.twofa.routes", "twofa_bp", None),
+)
+
 # ==========================================================
 # 2. Factory Function
 # ==========================================================
@@ -70,22 +161,58 @@ def create_app(config_string="config.Config"):
 
     # Inisialisasi logger internal app
     with app.app_context():
+        # Panggilan logging tidak melempar exception; tidak perlu try/except
+        app.logger.debug("Config PRINT_EMAILS_TO_CONSOLE=%s", app.config.get("PRINT_EMAILS_TO_CONSOLE"))
+
+        # Ensure upload folders exist.
+        # Hanya perlu sekali per deploy: set CREATE_UPLOAD_DIRS=0 (atau env
+        # SKIP_UPLOAD_FOLDER_SETUP=1) dan jalankan `flask init-dirs` saat
+        # deploy agar worker tidak mengulang stat/mkdir syscall tiap boot.
+        if app.config.get("CREATE_UPLOAD_DIRS", True) and not os.environ.get("SKIP_UPLOAD_FOLDER_SETUP"):
+            _create_upload_dirs(app)
+
+        # Root folder static absolut: dihitung sekali (tanpa getcwd per request)
+        app.config["_STATIC_ABS"] = str(Path(app.root_path, "static").resolve())
+
+        # Resolusi folder profile-pic + basename default: sekali di sini,
+        # route profile() tinggal membaca hasilnya (tanpa scan alias config)
+        for key in ("PROFILE_UPLOAD_FOLDER", "UPLOAD_FOLDER_PROFILE_PICS", "UPLOAD_PROFILE_FOLDER", "UPLOAD_FOLDER"):
+            val = app.config.get(key)
+            if val:
+                app.config["_PROFILE_UPLOAD_DIR_RESOLVED"] = val
+                break
+        else:
+            app.config["_PROFILE_UPLOAD_DIR_RESOLVED"] = os.path.join(
+                app.root_path, "static", "uploads", "profile_pics"
+            )
+
+        _default_profile = app.config.get("UPLOAD_DEFAULT_PROFILE")
+        app.config["_PROFILE_DEFAULT_BASENAME"] = (
+            os.path.basename(_default_profile)
+            if _default_profile and os.path.isabs(_default_profile)
+            else None
+        )
+
+    # ==========================================================
+    # 2.b JSON provider: pakai orjson (C-level) jika terpasang
+    # ==========================================================
+    if _HAS_ORJSON:
         try:
-            app.logger.debug("Config PRINT_EMAILS_TO_CONSOLE=%s", app.config.get("PRINT_EMAILS_TO_CONSOLE"))
-        except Exception as e:
-            app.logger.warning(f"Gagal mencetak debug config: {e}")
+            import orjson
+            from flask.json.provider import JSONProvider
 
-        # Ensure upload folders exist
-        upload_base = app.config.get("UPLOAD_FOLDER_BASE")
-        if upload_base:
-            try:
-                os.makedirs(upload_base, exist_ok=True)
-                for key in ("UPLOAD_FOLDER_ITEMS", "UPLOAD_FOLDER_PAYMENT_PROOFS", "UPLOAD_FOLDER_PROFILE_PICS"):
-                    p = app.config.get(key)
-                    if p:
-                        os.makedirs(p, exist_ok=True)
-            except Exception as e:
-                app.logger.error(f"Gagal menyiapkan folder upload: {e}")
+            class _OrjsonProvider(JSONProvider):
+                """Provider jsonify/get_json berbasis orjson (default=str untuk Decimal dkk)."""
+
+                def dumps(self, obj, **kwargs):
+                    return orjson.dumps(obj, default=str).decode("utf-8")
+
+                def loads(self, s, **kwargs):
+                    return orjson.loads(s)
+
+            app.json = _OrjsonProvider(app)
+        except Exception as e:
+            app.logger.warning(f"Gagal mengaktifkan orjson JSON provider: {e}")
 
     # ==========================================================
     # 3. Hubungkan Extension
@@ -97,11 +224,18 @@ def create_app(config_string="config.Config"):
     if _HAS_FLASK_MAIL and mail:
         mail.init_app(app)
 
+    # Executor kecil untuk I/O filesystem non-kritis (hapus file lama, dsb.)
+    # supaya syscall lambat (NFS/EFS) tidak memblokir respons request
+    io_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="fs")
+    app.extensions["io_executor"] = io_executor
+    atexit.register(io_executor.shutdown, False)
+
     # ==========================================================
     # 4. OPTIONAL: Talisman (security headers)
     # ==========================================================
     try:
         if _HAS_TALISMAN and app.config.get("ENABLE_TALISMAN", False) and not app.debug and not app.testing:
+            from flask_talisman import Talisman  # import hanya saat benar-benar dipakai
             talisman_csp = app.config.get("TALISMAN_CONTENT_SECURITY_POLICY", None)
             Talisman(
                 app,
@@ -116,43 +250,32 @@ def create_app(config_string="config.Config"):
     # ==========================================================
     with app.app_context():
         try:
-            from app import models  # noqa: F401
+            from app import models
+            _user_cls = models.User
         except Exception as e:
+            _user_cls = None
             app.logger.error(f"Gagal mengimport models: {e}. User loader mungkin tidak berfungsi.")
 
     # ==========================================================
     # 6. Register Blueprints
     # ==========================================================
-    common_blueprints = {
-        "app.main.routes": None,
-        "app.auth.routes": "/auth",
-        "app.catalog.routes": "/catalog",
-        "app.cart.routes": "/cart",
-        "app.booking.routes": "/booking",
-        "app.admin.routes": "/admin",
-        "app.account.routes": "/account",
-        "app.staff.routes": "/staff",
-        "app.twofa.routes": None,
-    }
-
-    def _find_blueprint_from_module(module):
-        """Helper untuk menemukan blueprint dari module"""
-        for candidate in ("bp", "auth_bp", "main_bp", "catalog_bp", "cart_bp", "booking_bp", "admin_bp", "account_bp", "staff_bp", "twofa_bp"):
-            bp = getattr(module, candidate, None)
-            if bp is not None:
-                return bp
-        return None
-
-    for module_path, url_prefix in common_blueprints.items():
+    # Import eager biasa: setiap entry registry memang mendefinisikan
+    # blueprint-nya, dan getattr di bawah toh langsung mengeksekusi body
+    # module — LazyLoader di sini tidak menunda apa pun, hanya mengaburkan
+    # traceback import error. (_lazy_import tetap dipakai untuk dependency
+    # opsional seperti pyotp/segno yang atributnya baru disentuh di route.)
+    for module_path, attr_name, url_prefix in BLUEPRINT_REGISTRY:
         try:
             mod = importlib.import_module(module_path)
-            bp = _find_blueprint_from_module(mod)
-            if bp:
+            bp = getattr(mod, attr_name, None)
+            if bp is not None:
                 if url_prefix:
                     app.register_blueprint(bp, url_prefix=url_prefix)
                 else:
                     app.register_blueprint(bp)
                 app.logger.info(f"✅ Blueprint '{module_path}' berhasil didaftarkan")
+            else:
+                app.logger.debug(f"ℹ️ Blueprint {module_path}: atribut '{attr_name}' tidak ditemukan")
         except Exception as e:
             app.logger.debug(f"ℹ️ Blueprint {module_path}: {e}")
 
@@ -168,37 +291,164 @@ def create_app(config_string="config.Config"):
     # ==========================================================
     # 8. Error Handlers
     # ==========================================================
-    @app.errorhandler(403)
-    def error_403(e):
-        return render_template("errors/403.html"), 403
-
-    @app.errorhandler(404)
-    def error_404(e):
-        return render_template("errors/404.html"), 404
-
-    @app.errorhandler(500)
-    def error_500(e):
-        return render_template("errors/500.html"), 500
+    app.register_error_handler(403, _error_403)
+    app.register_error_handler(404, _error_404)
+    app.register_error_handler(500, _error_500)
 
     @login_manager.user_loader
     def load_user(user_id):
+        if _user_cls is None:
+            return None
         try:
-            from app.models import User
-            return User.query.get(int(user_id))
+            uid = int(user_id)
+        except (TypeError, ValueError):
+            return None
+
+        # Cache per-request di flask.g: loader bisa dipanggil lebih dari
+        # sekali dalam satu request, cukup satu query DB
+        cached = getattr(g, "_loaded_user", None)
+        if cached is not None and cached.id == uid:
+            return cached
+
+        try:
+            # Session.get: cek identity map dulu, tanpa membangun objek Query
+            # (Query.get deprecated di SQLAlchemy 2.x)
+            user = db.session.get(_user_cls, uid)
         except Exception as e:
             app.logger.error(f"Login Manager gagal memuat user {user_id}: {e}")
             return None
 
+        if user is not None:
+            g._loaded_user = user
+        return user
+
+    # Halaman error statis → render sekali di factory; handler module-scope
+    # tinggal mengembalikan string dari app.extensions["error_pages"].
+    # Harus SETELAH user_loader terdaftar: base template menyentuh
+    # current_user, dan tanpa loader Flask-Login melempar saat render.
+    _error_pages = {}
+    try:
+        with app.test_request_context("/"):
+            for code in (403, 404, 500):
+                _error_pages[code] = render_template(f"errors/{code}.html")
+    except Exception as e:
+        app.logger.warning(f"Gagal pre-render template error: {e}")
+    app.extensions["error_pages"] = _error_pages
+
     # ==========================================================
     # 9. EMAIL Helpers
     # ==========================================================
-    def _send_async_wrapper(send_callable, *args, **kwargs):
-        """Wrapper untuk mengirim email di background thread"""
+    # Snapshot config yang dibaca di hot path send_email: sekali baca di sini,
+    # di dalam fungsi tinggal LOAD_DEREF (bukan dict-get per panggilan).
+    _print_emails_to_console = app.config.get("PRINT_EMAILS_TO_CONSOLE", False)
+    _mail_default_sender = app.config.get("MAIL_DEFAULT_SENDER")
+
+    # Mode console: body email masuk ring buffer (bukan diformat ke log di
+    # thread request); inspeksi via app.extensions["console_mailbox"]
+    _console_mailbox = deque(maxlen=app.config.get("CONSOLE_MAILBOX_SIZE", 200))
+    app.extensions["console_mailbox"] = _console_mailbox
+
+    # Pool worker email: thread hidup selama proses, satu koneksi SMTP
+    # per worker yang dipakai ulang antar pesan (hemat handshake TCP/TLS/AUTH).
+    # Executor dibuat lazy saat email pertama, bukan di create_app, supaya
+    # worker yang tidak pernah kirim email tidak bayar biaya setup thread.
+    _mail_local = threading.local()
+    _mail_connections = []
+    _mail_conn_lock = threading.Lock()
+
+    def _close_mail_pool():
+        """Tutup semua koneksi SMTP yang di-pool saat proses berhenti."""
+        executor = app.extensions.get("mail_executor")
+        if executor is not None:
+            executor.shutdown(wait=False)
+        with _mail_conn_lock:
+            for conn in _mail_connections:
+                try:
+                    conn.__exit__(None, None, None)
+                except Exception:
+                    pass
+            _mail_connections.clear()
+
+    def _get_mail_executor():
+        """Ambil (atau buat sekali) executor pengirim email."""
+        executor = app.extensions.get("mail_executor")
+        if executor is None:
+            with _mail_conn_lock:
+                executor = app.extensions.get("mail_executor")
+                if executor is None:
+                    executor = ThreadPoolExecutor(
+                        max_workers=app.config.get("MAIL_POOL_SIZE", 4),
+                        thread_name_prefix="mail",
+                    )
+                    app.extensions["mail_executor"] = executor
+                    atexit.register(_close_mail_pool)
+        return executor
+
+    def _drop_pooled_connection(conn):
+        """Buang koneksi yang sudah mati dari pool."""
+        with _mail_conn_lock:
+            if conn in _mail_connections:
+                _mail_connections.remove(conn)
+        try:
+            conn.__exit__(None, None, None)
+        except Exception:
+            pass
+        _mail_local.conn = None
+
+    def _get_pooled_connection():
+        """
+        Ambil koneksi SMTP milik thread worker ini.
+        Dibuat sekali (ehlo/starttls/login), lalu dipakai ulang;
+        health-check via NOOP, reconnect kalau server memutus sesi.
+        """
+        conn = getattr(_mail_local, "conn", None)
+        if conn is not None:
+            try:
+                if conn.host:
+                    conn.host.noop()
+                return conn
+            except Exception:
+                _drop_pooled_connection(conn)
+
+        conn = mail.connect()
+        conn.__enter__()
+        _mail_local.conn = conn
+        with _mail_conn_lock:
+            _mail_connections.append(conn)
+        return conn
+
+    def _log_mail_future(future):
+        """Done-callback: pastikan exception tak terduga di worker tidak hilang diam-diam."""
+        exc = future.exception()
+        if exc is not None:
+            app.logger.error(f"Job email gagal dengan exception tak tertangani: {exc}")
+
+    def _deliver_raw(envelope_sender, recipients, raw_bytes):
+        """
+        Kirim bytes MIME yang sudah diserialisasi di thread request.
+        Worker tinggal sendmail() lewat koneksi pool — tanpa kerja paket email.
+        """
         with app.app_context():
             try:
-                return send_callable(*args, **kwargs)
+                conn = _get_pooled_connection()
+                if conn.host:  # host None saat MAIL_SUPPRESS_SEND aktif
+                    conn.host.sendmail(envelope_sender, recipients, raw_bytes)
+                return True
+            except smtplib.SMTPServerDisconnected:
+                # Server menutup sesi: reconnect sekali lalu coba ulang
+                conn = getattr(_mail_local, "conn", None)
+                if conn is not None:
+                    _drop_pooled_connection(conn)
+                try:
+                    conn = _get_pooled_connection()
+                    if conn.host:
+                        conn.host.sendmail(envelope_sender, recipients, raw_bytes)
+                    return True
+                except Exception as e:
+                    app.logger.error(f"Gagal mengirim email setelah reconnect: {e}")
+                    return False
             except Exception as e:
-                app.logger.error(f"Gagal mengirim email di background thread: {e}")
+                app.logger.error(f"Gagal mengirim email di worker pool: {e}")
                 return False
 
     def send_email(subject, recipients, body, html=None, sender=None, force_send=False):
@@ -217,13 +467,12 @@ def create_app(config_string="config.Config"):
             recipients = [recipients]
 
         # Handle Console Printing (untuk development)
-        if app.config.get("PRINT_EMAILS_TO_CONSOLE", False) and not force_send:
-            try:
-                app.logger.info(f"[EMAIL-PRINT] To: {recipients} | Subject: {subject}")
-                app.logger.debug(f"[EMAIL-BODY]\n{body}")
-                return True
-            except Exception as e:
-                app.logger.error(f"Gagal mencetak email ke console: {e}")
+        # Tanpa try/except: logging tidak melempar, dan setup exception frame
+        # per panggilan adalah biaya murni di hot path
+        if _print_emails_to_console and not force_send:
+            _console_mailbox.append({"subject": subject, "recipients": recipients, "body": body})
+            app.logger.info(f"[EMAIL-PRINT] To: {recipients} | Subject: {subject}")
+            return True
 
         # Kirim email via Flask-Mail (async)
         if _HAS_FLASK_MAIL and mail:
@@ -233,14 +482,15 @@ def create_app(config_string="config.Config"):
                     recipients=recipients,
                     body=body,
                     html=html,
-                    sender=sender or app.config.get('MAIL_DEFAULT_SENDER')
+                    sender=sender or _mail_default_sender
                 )
-                # Kirim di background thread
-                threading.Thread(
-                    target=_send_async_wrapper,
-                    args=(mail.send, msg),
-                    daemon=True
-                ).start()
+                # Serialisasi MIME sekali di sini; worker pool cukup menerima
+                # bytes mentah + envelope (koneksi SMTP dipakai ulang).
+                envelope_sender = sanitize_address(msg.sender)
+                send_to = list(msg.send_to)
+                raw_bytes = msg.as_bytes()
+                future = _get_mail_executor().submit(_deliver_raw, envelope_sender, send_to, raw_bytes)
+                future.add_done_callback(_log_mail_future)
                 app.logger.info(f"✅ Email dijadwalkan: {subject} → {recipients}")
                 return True
             except Exception as e:
@@ -252,26 +502,97 @@ def create_app(config_string="config.Config"):
 
     app.send_email = send_email
 
+    def send_emails(messages, force_send=False):
+        """
+        Kirim beberapa email sekaligus lewat SATU sesi SMTP di worker pool
+        (mis. konfirmasi booking + tembusan admin) — handshake dibayar sekali.
+
+        Args:
+            messages: iterable dict dengan kunci subject, recipients, body,
+                      html (opsional), sender (opsional)
+            force_send: sama seperti send_email
+        """
+        batch = []
+        for spec in messages:
+            recipients = spec.get("recipients")
+            if isinstance(recipients, str):
+                recipients = [recipients]
+
+            if _print_emails_to_console and not force_send:
+                app.logger.info(f"[EMAIL-PRINT] To: {recipients} | Subject: {spec.get('subject')}")
+                continue
+
+            if not (_HAS_FLASK_MAIL and mail):
+                app.logger.warning("Flask-Mail tidak tersedia atau tidak dikonfigurasi.")
+                return False
+
+            msg = Message(
+                subject=spec.get("subject"),
+                recipients=recipients,
+                body=spec.get("body"),
+                html=spec.get("html"),
+                sender=spec.get("sender") or _mail_default_sender,
+            )
+            batch.append((sanitize_address(msg.sender), list(msg.send_to), msg.as_bytes()))
+
+        if not batch:
+            return True
+
+        def _deliver_batch():
+            ok = True
+            for envelope_sender, send_to, raw_bytes in batch:
+                if not _deliver_raw(envelope_sender, send_to, raw_bytes):
+                    ok = False
+            return ok
+
+        future = _get_mail_executor().submit(_deliver_batch)
+        future.add_done_callback(_log_mail_future)
+        app.logger.info(f"✅ Batch {len(batch)} email dijadwalkan dalam satu sesi SMTP")
+        return True
+
+    app.send_emails = send_emails
+
     # ==========================================================
     # 10. 2FA Helpers
     # ==========================================================
-    def qr_image_base64(provisioning_uri):
-        """Generate QR Code untuk 2FA dan return sebagai base64 image"""
-        if not qrcode:
-            app.logger.error("Library qrcode tidak ditemukan.")
-            return ""
-        try:
-            qr = qrcode.QRCode(box_size=6, border=2)
+    @lru_cache(maxsize=512)
+    def _qr_data_url(provisioning_uri, box_size, border):
+        """Hitung data-URL PNG; di-memoize per (URI, box_size, border)."""
+        buf = BytesIO()
+        if segno is not None:
+            # segno encode langsung ke PNG tanpa objek PIL perantara
+            segno.make(provisioning_uri, error="m").save(buf, kind="png", scale=box_size, border=border)
+        else:
+            qr = qrcode.QRCode(box_size=box_size, border=border)
             qr.add_data(provisioning_uri)
             qr.make(fit=True)
             img = qr.make_image(fill_color="black", back_color="white")
-            buf = BytesIO()
             img.save(buf, format="PNG")
-            return f"data:image/png;base64,{b64encode(buf.getvalue()).decode('ascii')}"
+        return f"data:image/png;base64,{b64encode(buf.getvalue()).decode('ascii')}"
+
+    def qr_image_base64(provisioning_uri, box_size=6, border=2):
+        """
+        Generate QR Code untuk 2FA dan return sebagai base64 image.
+        Matrix QR (Reed-Solomon) + encode PNG/base64 cukup dihitung sekali
+        per (URI, box_size, border); refresh halaman setup = lookup dict.
+        """
+        if not qrcode and segno is None:
+            app.logger.error("Library qrcode tidak ditemukan.")
+            return ""
+        try:
+            return _qr_data_url(provisioning_uri, box_size, border)
         except Exception as e:
             app.logger.error(f"Gagal membuat QR Code: {e}")
             return ""
 
     app.qr_image_base64 = qr_image_base64
-    
+
+    # ==========================================================
+    # 11. CLI Commands
+    # ==========================================================
+    @app.cli.command("init-dirs")
+    def init_dirs_command():
+        """Buat folder upload (jalankan sekali saat deploy)."""
+        _create_upload_dirs(app)
+
     return app
\ No newline at end of file
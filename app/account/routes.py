@@ -1,6 +1,8 @@
 # app/account/routes.py (FULL REPLACE - FIX: TEMPLATE PATH + OS PATH + AUTO-FIX WA)
 
 import os
+from functools import lru_cache
+from pathlib import PurePath
 from flask import (
     render_template,
     redirect,
@@ -18,43 +20,92 @@ from app.utils import save_picture
 account_bp = Blueprint('account', __name__)
 
 
-def _get_profile_url(filename: str):
+def _delete_file_async(path):
     """
-    Return a URL suitable for HTML <img> given stored filename.
-    Handles default images and absolute paths logic.
+    Hapus file di background lewat io_executor.
+    Langsung os.remove (FileNotFoundError diabaikan) — satu syscall,
+    tanpa exists/isfile dulu, dan tidak memblokir respons upload.
+    """
+    logger = current_app.logger
+    executor = current_app.extensions.get("io_executor")
+
+    def _remove():
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Gagal menghapus file lama di {path}: {e}")
+
+    if executor is not None:
+        executor.submit(_remove)
+    else:
+        _remove()
+
+
+@lru_cache(maxsize=4096)
+def _resolve_profile_static(static_folder, default_path, filename):
     """
+    Resolver murni: kembalikan (kind, value).
+    kind 'external' → value URL eksternal apa adanya,
+    kind 'static'   → value filename relatif untuk url_for('static').
+    Dipisah dari url_for supaya normalisasi path (abspath/relpath/isabs)
+    bisa di-memoize — inputnya praktis immutable selama proses hidup.
+    """
+    static_root = PurePath(static_folder)
+
+    def _rel_to_static(p):
+        # normpath (tanpa getcwd) + relative_to/as_posix menggantikan rantai
+        # abspath/relpath/replace("\\", "/") yang lama
+        try:
+            return PurePath(os.path.normpath(p)).relative_to(static_root).as_posix()
+        except ValueError:
+            return None
+
     if not filename:
-        default_path = current_app.config.get("UPLOAD_DEFAULT_PROFILE")
         if default_path:
-            static_folder = os.path.abspath(os.path.join(current_app.root_path, "static"))
-            try:
-                default_abs = os.path.abspath(default_path)
-                if default_abs.startswith(static_folder):
-                    rel = os.path.relpath(default_abs, static_folder).replace("\\", "/")
-                    return url_for("static", filename=rel)
-            except Exception as e:
-                current_app.logger.error(f"Gagal memproses default profile path: {e}")
-        
+            rel = _rel_to_static(default_path)
+            if rel:
+                return "static", rel
         # Fallback hardcoded jika config gagal
-        return url_for("static", filename="uploads/profile_pics/default.jpg")
+        return "static", "uploads/profile_pics/default.jpg"
+
+    name = str(filename)
 
     # Jika filename ternyata URL eksternal (https://...)
-    if str(filename).lower().startswith(("http://", "https://")):
-        return filename
+    if name.lower().startswith(("http://", "https://")):
+        return "external", name
 
     # --- PERBAIKAN: Menggunakan os.path.isabs (Bukan os.isabs) ---
-    if os.path.isabs(filename):
-        static_folder = os.path.abspath(os.path.join(current_app.root_path, "static"))
-        try:
-            absf = os.path.abspath(filename)
-            if absf.startswith(static_folder):
-                rel = os.path.relpath(absf, static_folder).replace("\\", "/")
-                return url_for("static", filename=rel)
-        except Exception as e:
-            current_app.logger.error(f"Gagal konversi absolute path gambar: {e}")
+    if os.path.isabs(name):
+        rel = _rel_to_static(name)
+        if rel:
+            return "static", rel
 
     # Default relative path di uploads/profile_pics/
-    return url_for("static", filename="uploads/profile_pics/" + filename)
+    return "static", "uploads/profile_pics/" + name
+
+
+def _get_profile_url(filename: str):
+    """
+    Return a URL suitable for HTML <img> given stored filename.
+    Handles default images and absolute paths logic (hasil di-memoize).
+    """
+    # Root static absolut sudah dihitung sekali di create_app
+    static_folder = current_app.config.get("_STATIC_ABS") or os.path.abspath(
+        os.path.join(current_app.root_path, "static")
+    )
+    default_path = current_app.config.get("UPLOAD_DEFAULT_PROFILE")
+
+    try:
+        kind, value = _resolve_profile_static(static_folder, default_path, filename)
+    except Exception as e:
+        current_app.logger.error(f"Gagal memproses path gambar profil: {e}")
+        return url_for("static", filename="uploads/profile_pics/default.jpg")
+
+    if kind == "external":
+        return value
+    return url_for("static", filename=value)
 
 
 @account_bp.route("/profile", methods=["GET", "POST"])
@@ -79,31 +130,15 @@ def profile():
             # Logika penghapusan file lama (Pembersihan sampah)
             try:
                 old = getattr(current_user, "image_file", None)
-                upload_folder = None
-                # Cek config key mana yang dipakai
-                for key in ("PROFILE_UPLOAD_FOLDER", "UPLOAD_FOLDER_PROFILE_PICS", "UPLOAD_PROFILE_FOLDER", "UPLOAD_FOLDER"):
-                    val = current_app.config.get(key)
-                    if val:
-                        upload_folder = val
-                        break
-                
-                # Fallback jika config tidak ketemu
-                if not upload_folder:
-                    upload_folder = os.path.join(current_app.root_path, "static", "uploads", "profile_pics")
-
-                default_name = None
-                default_path = current_app.config.get("UPLOAD_DEFAULT_PROFILE")
-                if default_path and os.path.isabs(default_path):
-                    default_name = os.path.basename(default_path)
+                # Folder + basename default sudah diresolusi sekali di create_app
+                upload_folder = current_app.config.get("_PROFILE_UPLOAD_DIR_RESOLVED") or os.path.join(
+                    current_app.root_path, "static", "uploads", "profile_pics"
+                )
+                default_name = current_app.config.get("_PROFILE_DEFAULT_BASENAME")
 
                 # Hapus hanya jika bukan default dan bukan URL eksternal
                 if old and old != default_name and not old.lower().startswith(("http://", "https://")):
-                    old_path = os.path.join(upload_folder, old)
-                    if os.path.exists(old_path) and os.path.isfile(old_path):
-                        try:
-                            os.remove(old_path)
-                        except Exception as e:
-                            current_app.logger.warning(f"Gagal menghapus file lama di {old_path}: {e}")
+                    _delete_file_async(os.path.join(upload_folder, old))
             except Exception as e:
                 current_app.logger.debug(f"Error saat mencari file lama untuk dihapus: {e}")
 
@@ -7,10 +7,15 @@ from flask import (
     abort,
     request,
     jsonify,
+    make_response,
     send_file,
     current_app,
+    g,
 )
 from flask_login import login_required, current_user
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, load_only, raiseload, selectinload
 from app import db, bcrypt
 from app.models import Category, Item, Rental, User, RentalItem
 from app.forms import (
@@ -21,11 +26,14 @@ from app.forms import (
 )
 from app.utils import save_picture
 from functools import wraps
-from datetime import timedelta
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from pathlib import Path
+import mimetypes
 import os
+import time
 
-# safer helpers from email_utils
-from app.utils import send_order_status_email # new
+# helper email dari email_utils dipakai per-route (lihat approve/reject/etc)
 
 # Buat blueprint
 admin_bp = Blueprint("admin", __name__)
@@ -37,16 +45,25 @@ admin_bp = Blueprint("admin", __name__)
 # ---------------------------------------------------------
 def _safe_send_email(subject, recipients, text_body, html_body=None, sender=None):
     """
-    Wrapper yang memanggil current_app.send_email (jika ada).
+    Wrapper yang memanggil app.send_email (jika ada).
     Menangkap exception supaya proses utama tidak crash bila email gagal.
     """
-    try:
-        send_fn = getattr(current_app, "send_email", None)
-        if not send_fn:
-            current_app.logger.warning("send_email() tidak tersedia di app.")
-            return False
+    # current_app adalah LocalProxy — deref sekali di atas, lalu pakai
+    # lokalnya; jalur test/CI (MAIL_SUPPRESS_SEND / MAIL_ENABLED=0)
+    # keluar duluan tanpa kerja apa pun
+    app = current_app._get_current_object()
+    log = app.logger
+
+    if app.config.get("MAIL_SUPPRESS_SEND") or not app.config.get("MAIL_ENABLED", True):
+        return False
+
+    send_fn = getattr(app, "send_email", None)
+    if not send_fn:
+        log.warning("send_email() tidak tersedia di app.")
+        return False
 
-        current_app.logger.debug("Scheduling email to %s (subject=%s)", recipients, subject)
+    try:
+        log.debug("Scheduling email to %s (subject=%s)", recipients, subject)
         return send_fn(
             subject,
             recipients,
@@ -55,7 +72,7 @@ def _safe_send_email(subject, recipients, text_body, html_body=None, sender=None
             sender=sender,
         )
     except Exception as exc:
-        current_app.logger.exception("Gagal mengirim email: %s", exc)
+        log.exception("Gagal mengirim email: %s", exc)
         return False
 
 # ==========================================================
@@ -82,12 +99,16 @@ def admin_required(f):
 # ----------------------------------------------------------
 # 2. ADMIN + STAFF
 # ----------------------------------------------------------
+# Frozenset di module scope: tanpa alokasi list per panggilan, membership O(1)
+_STAFF_OR_ADMIN = frozenset({"admin", "staff"})
+
+
 def staff_or_admin_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         if not current_user.is_authenticated:
             abort(403)
-        if current_user.role not in ["admin", "staff"]:
+        if current_user.role not in _STAFF_OR_ADMIN:
             abort(403)
         return f(*args, **kwargs)
     return decorated_function
@@ -118,6 +139,184 @@ def admin_2fa_required(f):
     return decorated_function
 
 
+# ----------------------------------------------------------
+# 4. RATE LIMIT ROUTE MUTASI (fixed window, in-process)
+# ----------------------------------------------------------
+# Flask-Limiter + Redis bukan dependensi proyek; counter per proses ini
+# sudah cukup untuk menahan badai commit dari retry loop / klien skrip.
+# Penolakan terjadi sebelum menyentuh SQL sama sekali.
+_MUTATION_RATE_LIMIT = 30   # request
+_MUTATION_RATE_WINDOW = 60  # detik
+_rate_windows = {}
+
+
+def rate_limited(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        key = str(current_user.get_id() or request.remote_addr)
+        now = time.monotonic()
+        start, count = _rate_windows.get(key, (now, 0))
+        if now - start >= _MUTATION_RATE_WINDOW:
+            start, count = now, 0
+        count += 1
+        # Jaga dict tetap kecil bila banyak key basi menumpuk
+        if len(_rate_windows) > 1024:
+            _rate_windows.clear()
+        _rate_windows[key] = (start, count)
+        if count > _MUTATION_RATE_LIMIT:
+            retry_after = max(1, int(_MUTATION_RATE_WINDOW - (now - start)))
+            resp = make_response("Terlalu banyak permintaan. Coba lagi nanti.", 429)
+            resp.headers["Retry-After"] = str(retry_after)
+            return resp
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+# ----------------------------------------------------------
+# Helper: redirect pasca-mutasi reservasi
+# Staff kembali ke dashboardnya, admin ke listing — dulu diduplikasi
+# di ekor setiap route mutasi.
+# ----------------------------------------------------------
+def _after_rental_mutation():
+    if current_user.role == "staff":
+        return redirect(url_for("staff.dashboard"))
+    return redirect(url_for("admin.manage_reservations"))
+
+
+# ----------------------------------------------------------
+# Helper: hitung unit per item dalam satu rental
+# Item yang sama sah muncul di beberapa RentalItem (durasi berbeda —
+# keranjang memakai kunci "{item_id}_{durasi}"), jadi WHERE id IN (...)
+# polos menghitung kurang: IN meng-collapse duplikat.
+# ----------------------------------------------------------
+def _rental_item_counts(rental):
+    return Counter(ri.item_id for ri in rental.items)
+
+
+def _group_ids_by_count(counts):
+    """Kelompokkan item_id per jumlah unit → satu UPDATE per nilai delta
+    (umumnya cuma satu kelompok), bukan satu statement per RentalItem."""
+    by_n = defaultdict(list)
+    for item_id, n in counts.items():
+        by_n[n].append(item_id)
+    return by_n
+
+
+def _restore_stock(counts):
+    """Kembalikan stok sebanyak unit yang dipinjam per item."""
+    for n, ids in _group_ids_by_count(counts).items():
+        db.session.execute(
+            update(Item)
+            .where(Item.id.in_(ids))
+            .values(stock=Item.stock + n)
+            .execution_options(synchronize_session=False)
+        )
+
+
+# ----------------------------------------------------------
+# Helper: pilihan kategori untuk dropdown form
+# ----------------------------------------------------------
+_CATEGORY_CACHE_TTL = 300  # detik; kategori jarang berubah
+
+
+def _category_choices():
+    """
+    Ambil (id, name) kategori via with_entities — tanpa hidrasi instance ORM
+    (identity map, instrumentation) yang tidak dibutuhkan untuk sekadar
+    mengisi choices dropdown. Hasil query dimaterialisasi jadi tuple polos:
+    WTForms 3 hanya meng-unpack list/tuple, objek Row gagal isinstance-check
+    itu dan malah dilempar ke coerce → TypeError.
+    Dua lapis memo: per-request di flask.g (re-render form pada request yang
+    sama tidak menyentuh cache lagi) dan per-app di extensions dengan TTL —
+    render form GET/POST biasa tidak perlu SELECT sama sekali. Mutasi
+    kategori memanggil _invalidate_category_choices().
+    """
+    choices = getattr(g, "_category_choices", None)
+    if choices is None:
+        cache = current_app.extensions.setdefault("category_choices", {})
+        cached = cache.get("rows")
+        now = time.monotonic()
+        if cached and now - cached[0] < _CATEGORY_CACHE_TTL:
+            choices = cached[1]
+        else:
+            choices = [
+                (cid, name)
+                for cid, name in Category.query.with_entities(Category.id, Category.name)
+                .order_by(Category.name)
+                .all()
+            ]
+            cache["rows"] = (now, choices)
+        g._category_choices = choices
+    return choices
+
+
+def _invalidate_category_choices():
+    current_app.extensions.setdefault("category_choices", {}).pop("rows", None)
+
+
+# ----------------------------------------------------------
+# Helper: paginate bernomor versi ringan
+# ----------------------------------------------------------
+class _FastPagination:
+    """Bentuk minimal Pagination yang dipakai template bernomor."""
+
+    def __init__(self, items, page, per_page, total):
+        self.items = items
+        self.page = page
+        self.per_page = per_page
+        self.total = total
+        self.pages = max(1, -(-total // per_page))
+
+    @property
+    def has_prev(self):
+        return self.page > 1
+
+    @property
+    def prev_num(self):
+        return self.page - 1 if self.has_prev else None
+
+    @property
+    def has_next(self):
+        return self.page < self.pages
+
+    @property
+    def next_num(self):
+        return self.page + 1 if self.has_next else None
+
+    def iter_pages(self, left_edge=2, left_current=2, right_current=4, right_edge=2):
+        # Port ringkas dari Flask-SQLAlchemy (None = elipsis)
+        pages_end = self.pages + 1
+        left_end = min(1 + left_edge, pages_end)
+        yield from range(1, left_end)
+        if left_end == pages_end:
+            return
+        mid_start = max(left_end, self.page - left_current)
+        mid_end = min(self.page + right_current + 1, pages_end)
+        if mid_start - left_end > 0:
+            yield None
+        yield from range(mid_start, mid_end)
+        if mid_end == pages_end:
+            return
+        right_start = max(mid_end, pages_end - right_edge)
+        if right_start - mid_end > 0:
+            yield None
+        yield from range(right_start, pages_end)
+
+
+def fast_paginate(query, page, per_page):
+    """
+    Pengganti Query.paginate() untuk listing bernomor: total dihitung
+    lewat count() dengan ORDER BY dan eager-load dibuang. Jangan ganti
+    dengan with_entities(func.count()): tanpa WHERE yang menyebut tabel,
+    FROM-nya ikut hilang dan SQL-nya jadi "SELECT count(*)" → total = 1.
+    """
+    page = max(page or 1, 1)
+    per_page = max(per_page or 10, 1)
+    total = query.enable_eagerloads(False).order_by(None).count() or 0
+    items = query.limit(per_page).offset((page - 1) * per_page).all()
+    return _FastPagination(items, page, per_page, total)
+
+
 # ==========================================================
 # 2. DASHBOARD -> LANGSUNG KE MANAJEMEN RESERVASI
 # ==========================================================
@@ -138,13 +337,17 @@ def manage_categories():
     form = CategoryForm()
     if form.validate_on_submit():
         name = form.name.data.strip()
-        exists = Category.query.filter_by(name=name).first()
-        if exists:
-            flash("Kategori dengan nama yang sama sudah ada.", "warning")
-            return redirect(url_for("admin.manage_categories"))
+        # Andalkan constraint UNIQUE di kolom name: satu INSERT saja,
+        # tanpa SELECT duplikat duluan (yang juga rawan race TOCTOU)
         category = Category(name=name)
         db.session.add(category)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            flash("Kategori dengan nama yang sama sudah ada.", "warning")
+            return redirect(url_for("admin.manage_categories"))
+        _invalidate_category_choices()
         flash("Kategori baru berhasil ditambahkan!", "success")
         return redirect(url_for("admin.manage_categories"))
 
@@ -164,17 +367,32 @@ def manage_items():
     page = request.args.get("page", 1, type=int)
     per_page = request.args.get("per_page", 10, type=int)
 
-    items = Item.query.order_by(Item.name).paginate(page=page, per_page=per_page, error_out=False)
-
-    categories = Category.query.order_by(Category.name).all()
-    category_form = CategoryForm()
+    # joinedload kategori: 1 query JOIN, bukan 1 + per_page SELECT (N+1).
+    # load_only memangkas kolom ke yang dirender tabel — description (TEXT)
+    # dan created_at tidak ikut terkirim per halaman.
+    items = fast_paginate(
+        Item.query.options(
+            load_only(
+                Item.id,
+                Item.name,
+                Item.stock,
+                Item.price_per_day,
+                Item.image_filename,
+                Item.category_id,
+            ),
+            joinedload(Item.category),
+        ).order_by(Item.name),
+        page,
+        per_page,
+    )
 
+    # Template manage_items tidak merender daftar kategori / form inline,
+    # jadi tidak ada query Category di sini; dropdown form memakai
+    # _category_choices() yang sudah di-cache
     return render_template(
         "admin/manage_items.html",
         title="Manajemen Stok Barang",
         items=items,
-        categories=categories,
-        category_form=category_form,
         per_page=per_page,
     )
 
@@ -189,14 +407,17 @@ def add_category_inline():
     form = CategoryForm()
     if form.validate_on_submit():
         name = form.name.data.strip()
-        exists = Category.query.filter_by(name=name).first()
-        if exists:
-            flash("Kategori dengan nama yang sama sudah ada.", "warning")
-        else:
-            c = Category(name=name)
-            db.session.add(c)
+        # Sama seperti manage_categories: INSERT langsung, duplikat
+        # ditangkap lewat IntegrityError dari constraint UNIQUE
+        c = Category(name=name)
+        db.session.add(c)
+        try:
             db.session.commit()
+            _invalidate_category_choices()
             flash(f"Kategori '{c.name}' berhasil ditambahkan.", "success")
+        except IntegrityError:
+            db.session.rollback()
+            flash("Kategori dengan nama yang sama sudah ada.", "warning")
     else:
         for field, errs in form.errors.items():
             for e in errs:
@@ -212,7 +433,10 @@ def add_category_inline():
 @admin_2fa_required
 def delete_category_inline(category_id):
     category = Category.query.get_or_404(category_id)
-    still_used = Item.query.filter_by(category_id=category.id).first()
+    still_used = (
+        db.session.scalar(select(1).where(Item.category_id == category.id).limit(1))
+        is not None
+    )
     if still_used:
         flash(
             f"Tidak bisa menghapus kategori '{category.name}' karena masih ada item yang memakai kategori ini.",
@@ -222,6 +446,7 @@ def delete_category_inline(category_id):
 
     db.session.delete(category)
     db.session.commit()
+    _invalidate_category_choices()
     flash(f"Kategori '{category.name}' berhasil dihapus.", "success")
     return redirect(url_for("admin.manage_items"))
 
@@ -234,7 +459,7 @@ def delete_category_inline(category_id):
 @admin_2fa_required
 def add_item():
     form = ItemForm()
-    form.category.choices = [(c.id, c.name) for c in Category.query.order_by(Category.name).all()]
+    form.category.choices = _category_choices()
     if form.validate_on_submit():
         if form.picture.data:
             picture_file = save_picture(form.picture.data, "UPLOAD_FOLDER_ITEMS", output_size=(500, 500))
@@ -267,7 +492,7 @@ def add_item():
 def edit_item(item_id):
     item = Item.query.get_or_404(item_id)
     form = ItemForm(obj=item)
-    form.category.choices = [(c.id, c.name) for c in Category.query.order_by(Category.name).all()]
+    form.category.choices = _category_choices()
 
     if form.validate_on_submit():
         if form.picture.data:
@@ -297,18 +522,97 @@ def edit_item(item_id):
     return render_template("admin/item_form.html", title=f"Edit Barang: {item.name}", form=form, current_image=current_image)
 
 
+# ----------------------------------------------------------
+# Helper: seek/keyset pagination untuk daftar reservasi
+# ----------------------------------------------------------
+class _CursorPage:
+    """Hasil seek-pagination: items + kursor, cukup untuk template."""
+
+    __slots__ = ("items", "has_prev", "has_next", "next_cursor")
+
+    def __init__(self, items, has_prev, has_next, next_cursor):
+        self.items = items
+        self.has_prev = has_prev
+        self.has_next = has_next
+        self.next_cursor = next_cursor
+
+
+def _strict_load_options():
+    """raiseload('*') di dev/test saja: relasi yang lupa di-eager-load
+    meledak jadi error saat development, bukan jadi N+1 diam-diam di
+    produksi. Opsi eksplisit (joinedload/selectinload) tetap menang."""
+    if current_app.debug or current_app.config.get("TESTING"):
+        return (raiseload("*"),)
+    return ()
+
+
+def paginate_rentals_by_cursor(query, after, per_page):
+    """
+    Seek pagination pada (created_at DESC, id DESC).
+
+    `after` adalah kursor "created_at_iso,id" dari baris terakhir halaman
+    sebelumnya. Beda dengan OFFSET: DB range-scan lewat index tanpa membaca
+    baris yang dilewati (O(per_page), bukan O(offset)), dan tidak ada
+    COUNT(*) sama sekali. Kursor tidak valid → mulai dari halaman pertama.
+    """
+    if after:
+        try:
+            ts_raw, id_raw = after.rsplit(",", 1)
+            ts = datetime.fromisoformat(ts_raw)
+            last_id = int(id_raw)
+        except (ValueError, TypeError):
+            after = None
+        else:
+            # Ditulis sebagai OR eksplisit (bukan tuple_ <) agar jalan juga
+            # di sqlite yang dipakai untuk dev
+            query = query.filter(
+                (Rental.created_at < ts)
+                | ((Rental.created_at == ts) & (Rental.id < last_id))
+            )
+
+    # Template listing memakai borrower + items + item (modal detail per
+    # baris), jadi objek penuh memang dibutuhkan — tapi diambil eager dalam
+    # hitungan query konstan, bukan 1 + 2 lazy-load per baris
+    rows = (
+        query.options(
+            joinedload(Rental.borrower),
+            selectinload(Rental.items).joinedload(RentalItem.item),
+            *_strict_load_options(),
+        )
+        .order_by(Rental.created_at.desc(), Rental.id.desc())
+        .limit(per_page + 1)
+        .all()
+    )
+    has_next = len(rows) > per_page
+    items = rows[:per_page]
+    next_cursor = None
+    if has_next:
+        last = items[-1]
+        next_cursor = f"{last.created_at.isoformat()},{last.id}"
+    return _CursorPage(items, bool(after), has_next, next_cursor)
+
+
+# Nilai filter yang dilayani (enum order_status + 'Selesai' dari
+# payment_status); di luar ini filter diabaikan — sekaligus mencegah
+# nilai sembarangan memicu scan non-index
+_VALID_STATUS_FILTERS = frozenset({"Ditinjau", "ACC", "Ditolak", "Selesai"})
+
+
 # ==========================================================
-# 7. MANAJEMEN RESERVASI + FILTER STATUS (PAGINATED)
+# 7. MANAJEMEN RESERVASI + FILTER STATUS (SEEK PAGINATION)
 # ==========================================================
 @admin_bp.route("/reservations")
 @login_required
 @staff_or_admin_required
 def manage_reservations():
     status_filter = request.args.get("status")
-    page = request.args.get("page", 1, type=int)
+    after = request.args.get("after")
     per_page = request.args.get("per_page", 10, type=int)
 
-    query = Rental.query.order_by(Rental.created_at.desc())
+    if status_filter and status_filter not in _VALID_STATUS_FILTERS:
+        status_filter = None
+
+    query = Rental.query
 
     if status_filter:
         if status_filter == "Selesai":
@@ -316,7 +620,8 @@ def manage_reservations():
         else:
             query = query.filter(Rental.order_status == status_filter)
 
-    rentals = query.paginate(page=page, per_page=per_page, error_out=False)
+    rentals = paginate_rentals_by_cursor(query, after, per_page)
+    # current_user adalah LocalProxy — ambil role sekali, bukan per akses
     is_staff_dashboard = (current_user.role == "staff")
 
     return render_template(
@@ -328,6 +633,23 @@ def manage_reservations():
     )
 
 
+# ----------------------------------------------------------
+# Helper: folder bukti bayar (di-resolve sekali per app)
+# ----------------------------------------------------------
+def _proof_dirs():
+    dirs = current_app.extensions.get("proof_dirs")
+    if dirs is None:
+        primary = current_app.config.get("UPLOAD_FOLDER_PAYMENT_PROOFS") or os.path.join(
+            current_app.root_path, "static", "uploads", "payment_proofs"
+        )
+        dirs = (
+            Path(primary),
+            Path(current_app.root_path) / "uploads" / "payment_proofs",
+        )
+        current_app.extensions["proof_dirs"] = dirs
+    return dirs
+
+
 # ==========================================================
 # NEW: VIEW PAYMENT PROOF (ADMIN ONLY)
 # ==========================================================
@@ -340,20 +662,32 @@ def view_proof(rental_id):
     if not proof_filename:
         abort(404)
 
-    upload_dir = current_app.config.get("UPLOAD_FOLDER_PAYMENT_PROOFS")
-    if not upload_dir:
-        upload_dir = os.path.join(current_app.root_path, "static", "uploads", "payment_proofs")
-
-    file_path = os.path.join(upload_dir, proof_filename)
-
-    if not os.path.exists(file_path):
-        alt = os.path.join(current_app.root_path, "uploads", "payment_proofs", proof_filename)
-        if os.path.exists(alt):
-            file_path = alt
-        else:
+    # Bila reverse proxy dikonfigurasi (PROOFS_ACCEL_REDIRECT_PREFIX),
+    # serahkan streaming file ke nginx/apache via X-Accel-Redirect:
+    # worker Python hanya membayar auth + header, byte file dilayani
+    # sendfile(2) oleh proxy (nginx juga yang meng-404 bila file hilang)
+    accel_prefix = current_app.config.get("PROOFS_ACCEL_REDIRECT_PREFIX")
+    if accel_prefix:
+        resp = make_response("")
+        resp.headers["X-Accel-Redirect"] = f"{accel_prefix.rstrip('/')}/{proof_filename}"
+        resp.headers["Content-Type"] = (
+            mimetypes.guess_type(proof_filename)[0] or "application/octet-stream"
+        )
+        return resp
+
+    # Folder sudah di-resolve sekali per app; happy path cuma satu stat()
+    primary_dir, fallback_dir = _proof_dirs()
+    file_path = primary_dir / proof_filename
+    if not file_path.is_file():
+        file_path = fallback_dir / proof_filename
+        if not file_path.is_file():
             abort(404)
 
-    return send_file(file_path, mimetype=None, as_attachment=False)
+    # conditional + max_age: fetch ulang bukti yang sama dijawab 304 dari
+    # ETag/If-Modified-Since tanpa membaca file lagi. Dengan
+    # USE_X_SENDFILE=1 (Apache/mod_xsendfile) Flask hanya mengirim header
+    # dan server web yang menyalurkan byte-nya.
+    return send_file(file_path, as_attachment=False, conditional=True, max_age=3600)
 
 
 # ==========================================================
@@ -362,19 +696,50 @@ def view_proof(rental_id):
 @admin_bp.route("/reservations/approve/<int:rental_id>", methods=["POST"])
 @login_required
 @staff_or_admin_required
+@rate_limited
 def approve_rental(rental_id):
-    rental = Rental.query.get_or_404(rental_id)
-
-    # Cek stok
-    for item_in_rental in rental.items:
-        item_db = item_in_rental.item
-        if item_db.stock <= 0:
-            flash(f"Gagal ACC: Stok untuk '{item_db.name}' sudah habis (0).", "danger")
-            return redirect(url_for("admin.manage_reservations"))
+    # Eager-load borrower + RentalItem + Item: jumlah query konstan, bukan
+    # 1 + lazy-load borrower + 2k lazy-load item saat email di bawah
+    rental = (
+        Rental.query.options(
+            joinedload(Rental.borrower),
+            selectinload(Rental.items).joinedload(RentalItem.item),
+            *_strict_load_options(),
+        )
+        .get_or_404(rental_id)
+    )
 
-    # Update stok
-    for item_in_rental in rental.items:
-        item_in_rental.item.stock -= 1
+    # Guard idempoten: replay/double-click tidak boleh memotong stok dua
+    # kali atau commit + email ulang
+    if rental.order_status == 'ACC':
+        flash(f"Reservasi #{rental.public_id} sudah di-ACC.", "info")
+        return _after_rental_mutation()
+
+    # Cek + potong stok atomik di DB: UPDATE kondisional stock >= kebutuhan.
+    # Pola lama (SELECT cek lalu kurangi di Python) adalah race TOCTOU — dua
+    # approval paralel yang berbagi item bisa sama-sama lolos cek dan membuat
+    # stok oversold. Potong per jumlah unit (bukan per id distinct): rental
+    # boleh memuat item yang sama di dua durasi.
+    counts = _rental_item_counts(rental)
+    shortage = False
+    for need, ids in _group_ids_by_count(counts).items():
+        res = db.session.execute(
+            update(Item)
+            .where(Item.id.in_(ids), Item.stock >= need)
+            .values(stock=Item.stock - need)
+            .execution_options(synchronize_session=False)
+        )
+        if res.rowcount != len(ids):
+            shortage = True
+            break
+    if shortage:
+        db.session.rollback()
+        rows = db.session.execute(
+            select(Item.id, Item.name, Item.stock).where(Item.id.in_(list(counts)))
+        ).all()
+        habis = [name for item_id, name, stock in rows if stock < counts[item_id]]
+        flash(f"Gagal ACC: Stok untuk '{', '.join(habis)}' tidak mencukupi.", "danger")
+        return redirect(url_for("admin.manage_reservations"))
 
     # Update status order
     rental.order_status = "ACC"
@@ -390,13 +755,17 @@ def approve_rental(rental_id):
         flash(f"✅ Reservasi #{rental.public_id} di-ACC. Menunggu pembayaran cash.", "success")
     
     db.session.commit()
+    _invalidate_calendar_cache()
 
-    # Kirim email ACC
-    send_order_status_email(rental.borrower, rental, 'order_approved.html', 'Pesanan Disetujui')
+    # Kirim email ACC lewat worker pool (app.send_email) — request tidak
+    # menunggu SMTP, beda dengan helper lama di utils yang sleep + kirim sinkron
+    try:
+        from app.email_utils import send_order_approved_email
+        send_order_approved_email(rental, rental.borrower, force_send=False)
+    except Exception as e:
+        current_app.logger.error(f"Gagal kirim email order_approved: {e}")
 
-    if current_user.role == "staff":
-        return redirect(url_for("staff.dashboard"))
-    return redirect(url_for("admin.manage_reservations"))
+    return _after_rental_mutation()
 
 
 # ==========================================================
@@ -405,23 +774,37 @@ def approve_rental(rental_id):
 @admin_bp.route("/reservations/reject/<int:rental_id>", methods=["POST"])
 @login_required
 @staff_or_admin_required
+@rate_limited
 def reject_rental(rental_id):
     """
     TOLAK ORDER / BUKTI BAYAR
     - Kembalikan stok jika sudah dipotong
     - Set status → Ditolak / Dibatalkan
     """
-    rental = Rental.query.get_or_404(rental_id)
+    rental = (
+        Rental.query.options(
+            joinedload(Rental.borrower),
+            selectinload(Rental.items).joinedload(RentalItem.item),
+            *_strict_load_options(),
+        )
+        .get_or_404(rental_id)
+    )
+
+    # Guard idempoten: order yang sudah ditolak tidak di-commit/email ulang
+    if rental.order_status == 'Ditolak':
+        flash(f'Order #{rental.public_id} sudah ditolak.', 'info')
+        return _after_rental_mutation()
 
-    # Kembalikan stok (jika order sudah di-ACC sebelumnya)
+    # Kembalikan stok (jika order sudah di-ACC sebelumnya) — per jumlah unit,
+    # sejalan dengan potongan di approve_rental
     if rental.order_status == 'ACC':
-        for item_in_rental in rental.items:
-            item_in_rental.item.stock += 1
+        _restore_stock(_rental_item_counts(rental))
 
     # Update status
     rental.order_status = 'Ditolak'
     rental.payment_status = 'Dibatalkan'
     db.session.commit()
+    _invalidate_calendar_cache()
 
     # Kirim email penolakan
     try:
@@ -432,9 +815,7 @@ def reject_rental(rental_id):
 
     flash(f'❌ Order #{rental.public_id} telah ditolak. Stok dikembalikan.', 'info')
 
-    if current_user.role == "staff":
-        return redirect(url_for("staff.dashboard"))
-    return redirect(url_for("admin.manage_reservations"))
+    return _after_rental_mutation()
 
 
 # ==========================================================
@@ -443,6 +824,7 @@ def reject_rental(rental_id):
 @admin_bp.route("/items/delete/<int:item_id>", methods=["POST"])
 @login_required
 @admin_2fa_required
+@rate_limited
 def delete_item(item_id):
     item = Item.query.get_or_404(item_id)
     db.session.delete(item)
@@ -470,8 +852,16 @@ def manage_staff():
     page = request.args.get("page", 1, type=int)
     per_page = request.args.get("per_page", 10, type=int)
 
-    users_query = User.query.filter(User.role != "admin").order_by(User.role.desc(), User.id.asc())
-    users = users_query.paginate(page=page, per_page=per_page, error_out=False)
+    # Listing staf hanya menampilkan identitas dasar; password_hash dan
+    # otp_secret tidak perlu ikut diambil per baris
+    users_query = (
+        User.query.options(
+            load_only(User.id, User.username, User.email, User.role, User.image_file)
+        )
+        .filter(User.role != "admin")
+        .order_by(User.role.desc(), User.id.asc())
+    )
+    users = fast_paginate(users_query, page, per_page)
 
     return render_template("admin/manage_staff.html", title="Manajemen Staf & Pengguna", form=form, users=users)
 
@@ -511,14 +901,22 @@ def edit_user(user_id):
 @admin_bp.route("/staff/delete/<int:user_id>", methods=["POST"])
 @login_required
 @admin_2fa_required
+@rate_limited
 def delete_user(user_id):
-    user = User.query.get_or_404(user_id)
+    # Session.get memakai identity map: tanpa kompilasi Query untuk lookup PK
+    user = db.session.get(User, user_id)
+    if user is None:
+        abort(404)
 
     if user.role == "admin" or user.id == current_user.id:
         flash("Anda tidak bisa menghapus akun Anda sendiri atau akun admin lain.", "danger")
         return redirect(url_for("admin.manage_staff"))
 
-    has_rental = Rental.query.filter_by(user_id=user.id).first()
+    # SELECT 1 ... LIMIT 1: DB cukup menjawab ada/tidak, tanpa mengambil
+    # dan menghidrasi satu baris Rental penuh hanya untuk cek eksistensi
+    has_rental = (
+        db.session.scalar(select(1).where(Rental.user_id == user.id).limit(1)) is not None
+    )
 
     if has_rental:
         flash(
@@ -533,6 +931,23 @@ def delete_user(user_id):
     return redirect(url_for("admin.manage_staff"))
 
 
+# ----------------------------------------------------------
+# Cache payload kalender (TTL pendek, in-process)
+# FullCalendar mem-poll endpoint ini berulang; body JSON yang sudah
+# diserialisasi disimpan per-app di extensions (aman untuk multi-app di
+# test) dan di-drop setiap ada mutasi reservasi.
+# ----------------------------------------------------------
+_CALENDAR_CACHE_TTL = 60  # detik
+
+
+def _calendar_cache():
+    return current_app.extensions.setdefault("calendar_cache", {})
+
+
+def _invalidate_calendar_cache():
+    _calendar_cache().pop("events", None)
+
+
 # ==========================================================
 # 14. DATA KALENDER (OPSIONAL)
 # ==========================================================
@@ -540,32 +955,50 @@ def delete_user(user_id):
 @login_required
 @admin_2fa_required
 def calendar_data():
-    rentals = Rental.query.filter((Rental.order_status == "ACC") | (Rental.payment_status == "Pengambilan")).all()
-
-    events_list = []
-    for rental in rentals:
-        user = rental.borrower
-        for rental_item in rental.items:
-            item = rental_item.item
-            start_date = rental.pickup_date
-            end_date = rental.pickup_date + timedelta(hours=rental_item.duration_hours)
-            title = f"{item.name} - {user.username}"
-
-            color = "#007bff"
-            if rental.payment_status == "Pengambilan":
-                color = "#28a745"
-
-            events_list.append(
-                {
-                    "title": title,
-                    "start": start_date.isoformat(),
-                    "end": end_date.isoformat(),
-                    "color": color,
-                    "url": url_for("admin.manage_reservations"),
-                }
-            )
-
-    return jsonify(events_list)
+    cache = _calendar_cache()
+    cached = cache.get("events")
+    now = time.monotonic()
+    if cached and now - cached[0] < _CALENDAR_CACHE_TTL:
+        resp = current_app.response_class(cached[1], mimetype="application/json")
+        resp.headers["Cache-Control"] = "private, max-age=30"
+        return resp
+
+    # Satu SELECT join Rental ⨝ RentalItem ⨝ Item ⨝ User yang hanya
+    # mengambil kolom yang dipakai — tanpa hidrasi objek ORM per baris
+    # dan tanpa loop bersarang Python di atas relasi lazy
+    rows = db.session.execute(
+        select(
+            Item.name,
+            User.username,
+            Rental.pickup_date,
+            RentalItem.duration_hours,
+            Rental.payment_status,
+        )
+        .select_from(Rental)
+        .join(RentalItem, RentalItem.rental_id == Rental.id)
+        .join(Item, Item.id == RentalItem.item_id)
+        .join(User, User.id == Rental.user_id)
+        .where((Rental.order_status == "ACC") | (Rental.payment_status == "Pengambilan"))
+    ).all()
+
+    # url_for dihitung sekali, bukan per event
+    reservations_url = url_for("admin.manage_reservations")
+
+    events_list = [
+        {
+            "title": f"{name} - {username}",
+            "start": pickup.isoformat(),
+            "end": (pickup + timedelta(hours=hours)).isoformat(),
+            "color": "#28a745" if payment_status == "Pengambilan" else "#007bff",
+            "url": reservations_url,
+        }
+        for name, username, pickup, hours, payment_status in rows
+    ]
+
+    resp = jsonify(events_list)
+    cache["events"] = (now, resp.get_data())
+    resp.headers["Cache-Control"] = "private, max-age=30"
+    return resp
 
 
 # ==========================================================
@@ -574,22 +1007,37 @@ def calendar_data():
 @admin_bp.route("/reservations/confirm_payment/<int:rental_id>", methods=["POST"])
 @login_required
 @staff_or_admin_required
+@rate_limited
 def confirm_payment(rental_id):
     """
     VALIDASI PEMBAYARAN (Transfer atau Cash)
     - Jika ada payment_proof → Validasi bukti transfer
     - Jika tidak ada → Konfirmasi cash/offline
     """
-    rental = Rental.query.get_or_404(rental_id)
+    # borrower + items dipakai saat menyusun email konfirmasi → eager sekalian
+    rental = (
+        Rental.query.options(
+            joinedload(Rental.borrower),
+            selectinload(Rental.items).joinedload(RentalItem.item),
+            *_strict_load_options(),
+        )
+        .get_or_404(rental_id)
+    )
 
     # Pastikan order sudah di-ACC
     if rental.order_status != 'ACC':
         flash('Order belum di-ACC, tidak bisa validasi pembayaran.', 'warning')
         return redirect(url_for('admin.manage_reservations'))
 
+    # Guard idempoten: konfirmasi ulang tidak perlu commit (fsync) + email lagi
+    if rental.payment_status == 'Pengambilan':
+        flash('Pembayaran sudah dikonfirmasi sebelumnya.', 'info')
+        return _after_rental_mutation()
+
     # Update status → PENGAMBILAN (siap diambil)
     rental.payment_status = 'Pengambilan'
     db.session.commit()
+    _invalidate_calendar_cache()
 
     # Kirim email konfirmasi
     try:
@@ -600,9 +1048,7 @@ def confirm_payment(rental_id):
 
     flash(f'✅ Pembayaran untuk order #{rental.public_id} telah dikonfirmasi. Barang siap diambil!', 'success')
 
-    if current_user.role == "staff":
-        return redirect(url_for("staff.dashboard"))
-    return redirect(url_for("admin.manage_reservations"))
+    return _after_rental_mutation()
 
 
 # ==========================================================
@@ -611,26 +1057,35 @@ def confirm_payment(rental_id):
 @admin_bp.route("/reservations/mark_returned/<int:rental_id>", methods=["POST"])
 @login_required
 @staff_or_admin_required
+@rate_limited
 def mark_as_returned(rental_id):
     """
     TANDAI SELESAI (Barang sudah dikembalikan)
     - Update status → Selesai
     - Kembalikan stok
     """
-    rental = Rental.query.get_or_404(rental_id)
+    rental = (
+        Rental.query.options(
+            joinedload(Rental.borrower),
+            selectinload(Rental.items).joinedload(RentalItem.item),
+            *_strict_load_options(),
+        )
+        .get_or_404(rental_id)
+    )
 
     # Pastikan sudah dalam status Pengambilan
     if rental.payment_status != 'Pengambilan':
         flash('Order belum dalam status "Siap Diambil".', 'warning')
         return redirect(url_for('admin.manage_reservations'))
 
-    # Kembalikan stok
-    for item_in_rental in rental.items:
-        item_in_rental.item.stock += 1
+    # Kembalikan stok per jumlah unit — duplikat item (durasi berbeda)
+    # ikut terhitung, beda dengan IN(...) polos yang meng-collapse-nya
+    _restore_stock(_rental_item_counts(rental))
 
     # Update status
     rental.payment_status = 'Selesai'
     db.session.commit()
+    _invalidate_calendar_cache()
 
     # Kirim email selesai
     try:
@@ -641,35 +1096,4 @@ def mark_as_returned(rental_id):
 
     flash(f'✅ Order #{rental.public_id} telah selesai. Stok dikembalikan.', 'success')
 
-    if current_user.role == "staff":
-        return redirect(url_for("staff.dashboard"))
-    return redirect(url_for("admin.manage_reservations"))
-
-
-# ==========================================================
-# 17. TANDAI DIAMBIL (LEGACY - OPTIONAL)
-# ==========================================================
-@admin_bp.route("/reservations/take/<int:rental_id>", methods=["POST"])
-@login_required
-@staff_or_admin_required
-def mark_as_taken(rental_id):
-    rental = Rental.query.get_or_404(rental_id)
-
-    rental.payment_status = "Pengambilan"
-    db.session.commit()
-
-    flash(f"Reservasi #{rental.public_id} telah diambil oleh penyewa.", "info")
-
-    borrower = rental.borrower
-    if borrower and getattr(borrower, "email", None):
-        subject = f"[Rentalkuy] Reservasi #{rental.public_id} - Siap Diambil"
-        body = (
-            f"Halo {borrower.username},\n\n"
-            f"Reservasi #{rental.public_id} sudah siap diambil.\n\n"
-            "Terima kasih,\nRentalkuy"
-        )
-        _safe_send_email(subject, [borrower.email], body)
-
-    if current_user.role == "staff":
-        return redirect(url_for("staff.dashboard"))
-    return redirect(url_for("admin.manage_reservations"))
\ No newline at end of file
+    return _after_rental_mutation()
@@ -21,9 +21,53 @@ from app.models import User
 from app.utils import send_reset_email 
 from flask_login import login_user, current_user, logout_user, login_required
 from flask_mail import Message
+from sqlalchemy.orm import load_only
 
 auth_bp = Blueprint("auth", __name__, template_folder="templates/auth")
 
+# Endpoint dashboard per role — satu lookup dict menggantikan rantai
+# if/elif yang membaca current_user.role berulang di jalur login
+ROLE_REDIRECTS = {"admin": "admin.dashboard", "staff": "staff.dashboard"}
+
+# Hash dummy untuk jalur "email tidak terdaftar": percobaan login tetap
+# membayar satu verifikasi bcrypt sehingga waktu respons tidak membocorkan
+# email mana yang ada di database. Di-generate sekali per proses (bukan per
+# request — generate_password_hash sama mahalnya dengan verifikasi itu
+# sendiri). Work factor ikut BCRYPT_LOG_ROUNDS di config.
+_dummy_password_hash = None
+
+
+def _get_dummy_hash():
+    global _dummy_password_hash
+    if _dummy_password_hash is None:
+        _dummy_password_hash = bcrypt.generate_password_hash(
+            "rentalkuy-dummy-password"
+        ).decode("utf-8")
+    return _dummy_password_hash
+
+
+# ----------------------------------------------------------
+# Rate limit reset password (fixed window per IP, in-process)
+# Bot yang memindai form lupa-password jangan sampai membanjiri SMTP;
+# pola window sama dengan pembatas mutasi di admin/routes.py.
+# ----------------------------------------------------------
+_RESET_RATE_LIMIT = 5     # permintaan per window per IP
+_RESET_RATE_WINDOW = 60   # detik
+_reset_windows = {}
+
+
+def _reset_request_allowed(ip):
+    now = time.monotonic()
+    window_start, count = _reset_windows.get(ip, (now, 0))
+    if now - window_start >= _RESET_RATE_WINDOW:
+        window_start, count = now, 0
+    if count >= _RESET_RATE_LIMIT:
+        return False
+    if len(_reset_windows) > 1024:
+        _reset_windows.clear()
+    _reset_windows[ip] = (window_start, count + 1)
+    return True
+
 # ==========================================================
 # REGISTRASI (TANPA NO HP)
 # ==========================================================
@@ -61,19 +105,25 @@ def register():
 @auth_bp.route("/login", methods=["GET", "POST"])
 def login():
     if current_user.is_authenticated:
-        if current_user.role == "admin":
-            return redirect(url_for("admin.dashboard"))
-        if current_user.role == "staff":
-            return redirect(url_for("staff.dashboard"))
-        return redirect(url_for("main.home"))
+        endpoint = ROLE_REDIRECTS.get(current_user.role, "main.home")
+        return redirect(url_for(endpoint))
 
     form = LoginForm()
 
     if form.validate_on_submit():
-        user = User.query.filter_by(email=form.email.data).first()
+        # Endpoint terpanas: cukup kolom yang benar-benar dipakai alur login,
+        # tidak perlu menarik seluruh lebar tabel users per percobaan
+        user = (
+            User.query
+            .options(load_only(User.id, User.role, User.password_hash, User.otp_secret))
+            .filter_by(email=form.email.data)
+            .first()
+        )
 
         # DETEKTIF KASUS 1: Email tidak ditemukan
         if not user:
+            # Verifikasi dummy agar cabang ini semahal cek password sungguhan
+            bcrypt.check_password_hash(_get_dummy_hash(), form.password.data)
             flash("Login Gagal: Email tidak terdaftar. Silakan daftar akun terlebih dahulu.", "danger")
         
         # DETEKTIF KASUS 2: Password tidak cocok
@@ -82,8 +132,10 @@ def login():
         
         # KASUS 3: Sukses (Validasi Berhasil)
         else:
+            role = user.role
+
             # --- LOGIKA ADMIN (2FA) ---
-            if user.role == "admin":
+            if role == "admin":
                 session["pre_2fa_userid"] = user.id
                 session["pre_2fa_remember"] = bool(form.remember.data)
 
@@ -97,8 +149,8 @@ def login():
             # --- LOGIN NORMAL (PENYEWA/STAFF) ---
             login_user(user, remember=form.remember.data)
 
-            if user.role == "staff":
-                return redirect(url_for("staff.dashboard"))
+            if role in ROLE_REDIRECTS:
+                return redirect(url_for(ROLE_REDIRECTS[role]))
 
             next_page = request.args.get('next')
             return redirect(next_page) if next_page else redirect(url_for("main.home"))
@@ -116,7 +168,19 @@ def reset_request():
     
     form = RequestResetForm()
     if form.validate_on_submit():
-        user = User.query.filter_by(email=form.email.data).first()
+        # Di atas limit: balas persis seperti jalur sukses (anti enumerasi),
+        # tanpa query DB dan tanpa menyentuh SMTP
+        if not _reset_request_allowed(request.remote_addr or "-"):
+            flash('Instruksi reset password telah dikirim ke email Anda. Silakan cek inbox.', 'info')
+            return redirect(url_for('auth.login'))
+
+        # Token reset hanya butuh id, alamat tujuan, dan nama untuk sapaan
+        user = (
+            User.query
+            .options(load_only(User.id, User.email, User.username))
+            .filter_by(email=form.email.data)
+            .first()
+        )
         try:
             # Fungsi send_reset_email sekarang dipanggil dari utils.py
             send_reset_email(user)
@@ -164,7 +228,7 @@ def twofa_verify():
         flash("Sesi 2FA tidak valid atau kadaluarsa.", "warning")
         return redirect(url_for("auth.login"))
 
-    user = User.query.get(user_id)
+    user = db.session.get(User, user_id)
     if not user or user.role != "admin":
         flash("Akses admin tidak valid.", "danger")
         return redirect(url_for("auth.login"))
@@ -15,7 +15,7 @@ import logging
 import traceback
 from datetime import datetime, date
 from types import SimpleNamespace
-from flask import current_app, render_template
+from flask import current_app
 
 _log = logging.getLogger(__name__)
 
@@ -97,13 +97,28 @@ def _build_safe_person(person):
 # ==========================================================
 # RENDER AMAN
 # ==========================================================
+# Objek Template terkompilasi di-memo per (app, nama): melewati dispatch
+# render_template (sinyal + lookup environment) setiap kirim email.
+# Kunci menyertakan id(app) supaya multi-app di test tidak saling tukar env.
+_TEMPLATE_CACHE = {}
+
+
+def _get_template(template_name):
+    key = (id(current_app._get_current_object()), template_name)
+    tpl = _TEMPLATE_CACHE.get(key)
+    if tpl is None:
+        tpl = current_app.jinja_env.get_template(template_name)
+        _TEMPLATE_CACHE[key] = tpl
+    return tpl
+
+
 def _render_safe(template_name, context):
     """
     Render template dengan error handling
     Return None jika gagal
     """
     try:
-        return render_template(template_name, **context)
+        return _get_template(template_name).render(**context)
     except Exception:
         _log.error(
             "Gagal render template %s\n%s",
@@ -145,16 +160,35 @@ def send_template_email(
     """
     if isinstance(recipients, str):
         recipients = [recipients]
+    recipients = [r for r in recipients or [] if r]
+
+    # Cek kelayakan kirim SEBELUM membangun context & render Jinja —
+    # tanpa penerima / send_email / MAIL_ENABLED, HTML-nya toh dibuang
+    send_fn = getattr(current_app, "send_email", None)
+    if not recipients or send_fn is None or not current_app.config.get("MAIL_ENABLED", True):
+        _log.warning(
+            "send_template_email '%s' dilewati (recipients=%d, send_email=%s, MAIL_ENABLED=%s)",
+            subject,
+            len(recipients),
+            send_fn is not None,
+            current_app.config.get("MAIL_ENABLED", True),
+        )
+        return False
 
     # Build safe context (anti lazy-load)
     safe_rental = _build_safe_rental(rental)
     safe_person = _build_safe_person(person)
 
+    # Alias user/order ikut dikirim: template email lama (order_approved dkk)
+    # memakai {{ user.username }} dan {{ order.public_id }} — tanpa alias ini
+    # render jatuh ke fallback generik "cek dashboard"
     context = {
         "rental": safe_rental,
+        "order": safe_rental,
         "borrower": safe_person,
         "buyer": safe_person,
         "person": safe_person,
+        "user": safe_person,
         "mail_footer": current_app.config.get(
             "MAIL_FOOTER",
             "Rentalkuy · Jl. Contoh No.1 · 0896-7833-XXXX",
@@ -192,7 +226,7 @@ def send_template_email(
 
     # Kirim via app.send_email
     try:
-        return current_app.send_email(
+        return send_fn(
             subject=subject,
             recipients=recipients,
             body=plain,
@@ -21,7 +21,7 @@ from wtforms.validators import (
 )
 from flask_login import current_user
 from datetime import date
-from app.models import User, Category, Item
+from app.models import User
 from flask import current_app
 import os
 
@@ -238,10 +238,9 @@ class CategoryForm(FlaskForm):
     )
     submit = SubmitField("Save Category")
 
-    def validate_name(self, name):
-        category = Category.query.filter_by(name=name.data).first()
-        if category:
-            raise ValidationError("That category name already exists. Try another name.")
+    # Tidak ada validator duplikat di level form: constraint UNIQUE di kolom
+    # name jadi satu-satunya penentu, route menangkap IntegrityError-nya.
+    # (Validator SELECT lama membuat jalur sukses bayar dua query.)
 
 
 # ------------------------------------------------------------------
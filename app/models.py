@@ -46,7 +46,7 @@ class User(db.Model, UserMixin):
             user_id = s.loads(token, max_age=expires_sec)['user_id']
         except Exception:
             return None
-        return User.query.get(user_id)
+        return db.session.get(User, user_id)
     # ------------------------------------------------------------------
 
     # Helpers Password
@@ -132,6 +132,17 @@ class Rental(db.Model):
 
     items = db.relationship('RentalItem', backref='rental', lazy=True)
 
+    # Cermin dari index di migrations (c3f1a84be210, e7d20b5c9f14) —
+    # dideklarasikan di model juga supaya autogenerate berikutnya tidak
+    # menganggapnya yatim dan menerbitkan drop_index.
+    # (created_at, id): seek pagination manage_reservations;
+    # (status, created_at): filter listing + predikat OR calendar_data.
+    __table_args__ = (
+        db.Index('ix_rentals_created_at_id', 'created_at', 'id'),
+        db.Index('ix_rentals_order_status_created_at', 'order_status', 'created_at'),
+        db.Index('ix_rentals_payment_status_created_at', 'payment_status', 'created_at'),
+    )
+
     def __repr__(self):
         pid = self.public_id if getattr(self, "public_id", None) else self.id
         return f"Rental('{pid}', 'User: {self.user_id}', 'Status: {self.order_status}')"
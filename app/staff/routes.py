@@ -41,13 +41,16 @@ def staff_required(f):
 
 
 # -------------------------
-# Helper: build base query & apply status filter + paginate
+# Helper: build base query & apply status filter + seek pagination
+# (kursor "created_at,id", tanpa OFFSET/COUNT — lihat admin.routes)
 # -------------------------
-def _get_rentals(status_filter, page, per_page):
-    q = Rental.query.order_by(Rental.created_at.desc())
+def _get_rentals(status_filter, after, per_page):
+    from app.admin.routes import paginate_rentals_by_cursor
+
+    q = Rental.query
     if status_filter:
         q = q.filter(Rental.order_status == status_filter)
-    return q.paginate(page=page, per_page=per_page, error_out=False)
+    return paginate_rentals_by_cursor(q, after, per_page)
 
 
 # ==========================================================
@@ -59,11 +62,11 @@ def _get_rentals(status_filter, page, per_page):
 @login_required
 @staff_required
 def dashboard():
-    page = request.args.get('page', 1, type=int)
+    after = request.args.get('after', type=str)  # kursor halaman sebelumnya
     per_page = request.args.get('per_page', current_app.config.get('ITEMS_PER_PAGE', 10), type=int)
     status = request.args.get('status', type=str)  # None or status string
 
-    rentals = _get_rentals(status, page, per_page)
+    rentals = _get_rentals(status, after, per_page)
 
     # ringkasan metrics untuk widget (sederhana)
     today = date.today()
@@ -12,13 +12,25 @@ from flask import (
     session,
 )
 from flask_login import login_required, current_user, logout_user
-from app import db
+from functools import lru_cache
+from sqlalchemy.orm import load_only
+from app import db, _lazy_import, _probe_module
+import re
 import time, datetime
 
-try:
-    import pyotp
-except Exception:
-    pyotp = None
+# Bentuk kode OTP yang valid — tolak input sampah (bot) lewat satu match
+# murah sebelum membayar HMAC-SHA1 per langkah valid_window di TOTP.verify
+_OTP_RE = re.compile(r"^\d{6}$")
+
+# Probe metadata saja; body pyotp baru dieksekusi saat TOTP pertama dipakai
+pyotp = _lazy_import("pyotp") if _probe_module("pyotp") else None
+
+
+@lru_cache(maxsize=256)
+def _totp_for(secret):
+    """TOTP per secret di-memo: konstruksi pyotp.TOTP mem-parse base32
+    setiap kali, padahal secret admin tidak berubah antar percobaan login."""
+    return pyotp.TOTP(secret)
 
 twofa_bp = Blueprint("twofa", __name__, url_prefix="/admin/2fa")
 
@@ -134,7 +146,7 @@ def twofa_confirm():
         flash("Kode 2FA tidak boleh kosong.", "danger")
         return redirect(url_for("twofa.twofa_setup"))
 
-    if len(code) != 6 or not code.isdigit():
+    if not _OTP_RE.match(code):
         flash("Kode 2FA harus 6 digit angka.", "danger")
         return redirect(url_for("twofa.twofa_setup"))
 
@@ -187,7 +199,13 @@ def twofa_login_verify():
         return redirect(url_for("auth.login"))
 
     from app.models import User
-    user = User.query.get(user_id)
+    # Session.get + load_only: endpoint ini dihantam ulang saat retry/lockout,
+    # jadi cukup baca kolom yang dipakai verifikasi saja
+    user = db.session.get(
+        User,
+        user_id,
+        options=(load_only(User.id, User.role, User.otp_secret),),
+    )
 
     if not user or not user.otp_secret:
         flash("2FA tidak aktif.", "danger")
@@ -195,6 +213,12 @@ def twofa_login_verify():
 
     code = (request.form.get("code") or "").strip()
 
+    # Cek bentuk dulu: input yang jelas bukan OTP tidak perlu menyentuh
+    # TOTP sama sekali (verify menghitung HMAC per langkah valid_window)
+    if not _OTP_RE.match(code):
+        flash("Kode 2FA salah.", "danger")
+        return redirect(url_for("twofa.verify_page"))
+
     # ===== DEBUG LOG =====
     print("\n======= 2FA DEBUG =======")
     print("SERVER TIME:", datetime.datetime.now())
@@ -202,15 +226,11 @@ def twofa_login_verify():
     print("SECRET LENGTH:", len(user.otp_secret))
     print("INPUT CODE:", code)
 
-    totp = pyotp.TOTP(user.otp_secret)
+    totp = _totp_for(user.otp_secret)
     server_otp = totp.now()
     print("SERVER OTP NOW:", server_otp)
     print("=========================\n")
 
-    if not code.isdigit() or len(code) != 6:
-        flash("Kode 2FA salah.", "danger")
-        return redirect(url_for("twofa.verify_page"))
-
     if not totp.verify(code, valid_window=2):
         flash("Kode 2FA salah.", "danger")
         return redirect(url_for("twofa.verify_page"))
@@ -20,20 +20,34 @@ ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "webp", "gif"}
 # ==========================================================
 
 def send_reset_email(user):
-    """Kirim email reset password dengan jeda agar tidak terkena Rate Limit"""
-    time.sleep(2) # Jeda keamanan 2 detik
+    """Susun email reset password di request, kirim via pool mail background.
+
+    Token + URL butuh request context (url_for _external), jadi dirender di
+    sini; handshake SMTP-nya jalan di worker app.send_email sehingga respons
+    form tidak menunggu jaringan. Jeda time.sleep(2) lama sudah tidak perlu:
+    reset_request kini dibatasi per-IP di auth/routes.py.
+    """
+    if user is None or not getattr(user, "email", None):
+        return
+
     token = user.get_reset_token()
     reset_url = url_for('auth.reset_token', token=token, _external=True)
-    msg = Message('Permintaan Reset Password - RentalKuy',
-                  recipients=[user.email])
-    
-    msg.html = render_template('emails/reset_password_email.html', 
-                               reset_url=reset_url, 
-                               user=user)
-    try:
-        mail.send(msg)
-    except Exception as e:
-        current_app.logger.error(f"Gagal kirim email reset ke {user.email}: {str(e)}")
+
+    html = render_template('emails/reset_password_email.html',
+                           reset_url=reset_url,
+                           user=user)
+
+    send_fn = getattr(current_app, "send_email", None)
+    if send_fn is None:
+        current_app.logger.warning("send_reset_email: app.send_email tidak tersedia.")
+        return
+
+    send_fn(
+        subject='Permintaan Reset Password - RentalKuy',
+        recipients=[user.email],
+        body=f"Buka tautan berikut untuk reset password akun Anda: {reset_url}",
+        html=html,
+    )
 
 def send_order_status_email(user, order, template_name, subject):
     """
@@ -38,6 +38,18 @@ class Config:
     # Optional echo for debug SQL
     SQLALCHEMY_ECHO = os.environ.get("SQLALCHEMY_ECHO", "0").lower() in ("1", "true", "yes")
 
+    # Connection-pool tuning for the long-lived engine:
+    # - pre_ping detects connections the server already dropped (MySQL wait_timeout)
+    # - recycle keeps pooled connections younger than typical server timeouts
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        "pool_pre_ping": True,
+        "pool_recycle": int(os.environ.get("DB_POOL_RECYCLE", 280)),
+    }
+    # Pool sizing only makes sense for real servers (sqlite ignores/chokes on it)
+    if not SQLALCHEMY_DATABASE_URI.startswith("sqlite"):
+        SQLALCHEMY_ENGINE_OPTIONS["pool_size"] = int(os.environ.get("DB_POOL_SIZE", 10))
+        SQLALCHEMY_ENGINE_OPTIONS["max_overflow"] = int(os.environ.get("DB_MAX_OVERFLOW", 5))
+
     # ----------------------------
     # Upload folders (absolute paths)
     # ----------------------------
@@ -59,6 +71,16 @@ class Config:
     PAYMENT_UPLOAD_FOLDER = UPLOAD_FOLDER_PAYMENT_PROOFS
     UPLOAD_FOLDER = UPLOAD_FOLDER_BASE
 
+    # Internal location di reverse proxy untuk bukti bayar (X-Accel-Redirect).
+    # Contoh nginx:
+    #   location /internal/proofs/ { internal; alias <UPLOAD_FOLDER_PAYMENT_PROOFS>/; }
+    # Kosong (default) -> view_proof memakai send_file lewat worker Python.
+    PROOFS_ACCEL_REDIRECT_PREFIX = os.environ.get("PROOFS_ACCEL_REDIRECT_PREFIX", "")
+
+    # Padanan untuk Apache + mod_xsendfile: Flask cukup mengirim header
+    # X-Sendfile dan byte file dilayani server web
+    USE_X_SENDFILE = os.environ.get("USE_X_SENDFILE", "0").lower() in ("1", "true", "yes")
+
     # Max upload by default 10 MB (in bytes)
     MAX_CONTENT_LENGTH = int(os.environ.get("MAX_CONTENT_LENGTH", 10 * 1024 * 1024))
 
@@ -69,6 +91,13 @@ class Config:
     UPLOAD_DEFAULT_ITEM = os.environ.get("UPLOAD_DEFAULT_ITEM", os.path.join(UPLOAD_FOLDER_ITEMS, "default_item.jpg"))
     UPLOAD_DEFAULT_PROFILE = os.environ.get("UPLOAD_DEFAULT_PROFILE", os.path.join(UPLOAD_FOLDER_PROFILE_PICS, "default.jpg"))
 
+    # ----------------------------
+    # Startup behaviour
+    # ----------------------------
+    # Create upload folders during create_app (safe default for dev/first boot).
+    # Production can set 0 and run `flask init-dirs` once at deploy instead.
+    CREATE_UPLOAD_DIRS = os.environ.get("CREATE_UPLOAD_DIRS", "1").lower() in ("1", "true", "yes")
+
     # ----------------------------
     # Pagination / UI
     # ----------------------------
@@ -77,6 +106,12 @@ class Config:
     # ----------------------------
     # Security / headers
     # ----------------------------
+    # bcrypt work factor (Flask-Bcrypt reads this key).
+    # 12 is the library default; lower it (min 10) only if login throughput on
+    # the deployment hardware demands it — each extra round doubles hash time.
+    # Test runs drop to 10 so hashing does not dominate suite time.
+    BCRYPT_LOG_ROUNDS = int(os.environ.get("BCRYPT_LOG_ROUNDS", 10 if TESTING else 12))
+
     ENABLE_TALISMAN = os.environ.get("ENABLE_TALISMAN", "0").lower() in ("1", "true", "yes")
     TALISMAN_CONTENT_SECURITY_POLICY = None
     TALISMAN_FORCE_HTTPS = os.environ.get("TALISMAN_FORCE_HTTPS", "0").lower() in ("1", "true", "yes")
@@ -94,6 +129,9 @@ class Config:
     # ----------------------------
     # Mail / Email (Flask-Mail)
     # ----------------------------
+    # Matikan total jalur email (termasuk render template-nya) di dev/test
+    MAIL_ENABLED = os.environ.get("MAIL_ENABLED", "1").lower() in ("1", "true", "yes")
+
     MAIL_SERVER = os.environ.get("MAIL_SERVER", "smtp.mailtrap.io")
     MAIL_PORT = int(os.environ.get("MAIL_PORT", os.environ.get("MAILPORT", 2525)))
     MAIL_USE_TLS = os.environ.get("MAIL_USE_TLS", "1").lower() in ("1", "true", "yes")
@@ -107,6 +145,10 @@ class Config:
     # Friendly footer used by templates and fallback HTML in email_utils / routes
     MAIL_FOOTER = os.environ.get("MAIL_FOOTER", "Rentalkuy · Jl. Contoh No.1 · 0896-7833-XXXX")
 
+    # Number of background mail workers (keep below provider connection limits,
+    # e.g. Gmail ~15, Zoho 5-10)
+    MAIL_POOL_SIZE = int(os.environ.get("MAIL_POOL_SIZE", 4))
+
     # ----------------------------
     # Two-Factor Authentication (TOTP)
     # ----------------------------
@@ -0,0 +1,30 @@
+# gunicorn.conf.py
+"""
+Konfigurasi Gunicorn untuk produksi.
+
+Jalankan dengan:
+    gunicorn -c gunicorn.conf.py "app.wsgi:app"
+
+Kenapa gthread:
+- Worker sync memblokir satu request penuh per proses; thread email/I-O
+  (mail pool, io_executor) tidak pernah benar-benar jalan paralel.
+- bcrypt dan koneksi SMTP melepas GIL, jadi worker gthread memberi
+  concurrency nyata untuk login + pengiriman email tanpa biaya proses ekstra.
+"""
+import os
+
+worker_class = "gthread"
+workers = int(os.environ.get("GUNICORN_WORKERS", 2))
+threads = int(os.environ.get("GUNICORN_THREADS", 8))
+
+# Recycle worker secara berkala agar memory leak kecil tidak menumpuk
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 1000))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", 100))
+
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", 5))
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+accesslog = os.environ.get("GUNICORN_ACCESSLOG", "-")
+errorlog = os.environ.get("GUNICORN_ERRORLOG", "-")
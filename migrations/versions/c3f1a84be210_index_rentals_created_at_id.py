@@ -0,0 +1,32 @@
+"""Index rentals (created_at, id) untuk seek pagination
+
+Revision ID: c3f1a84be210
+Revises: 9666f67b0e07
+Create Date: 2026-08-29 10:12:07.430122
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3f1a84be210'
+down_revision = '9666f67b0e07'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Composite index menopang ORDER BY created_at DESC, id DESC + filter
+    # kursor di manage_reservations / staff dashboard (range scan, tanpa sort)
+    with op.batch_alter_table('rentals', schema=None) as batch_op:
+        batch_op.create_index(
+            'ix_rentals_created_at_id',
+            ['created_at', 'id'],
+            unique=False,
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('rentals', schema=None) as batch_op:
+        batch_op.drop_index('ix_rentals_created_at_id')
@@ -0,0 +1,39 @@
+"""Index rentals (status, created_at) untuk filter listing
+
+Revision ID: e7d20b5c9f14
+Revises: c3f1a84be210
+Create Date: 2026-08-29 11:02:44.118675
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7d20b5c9f14'
+down_revision = 'c3f1a84be210'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Menopang manage_reservations: WHERE order_status/payment_status = ...
+    # ORDER BY created_at DESC — index scan, tanpa filesort di tabel besar.
+    # Predikat OR calendar_data juga bisa memakai keduanya (index merge).
+    with op.batch_alter_table('rentals', schema=None) as batch_op:
+        batch_op.create_index(
+            'ix_rentals_order_status_created_at',
+            ['order_status', 'created_at'],
+            unique=False,
+        )
+        batch_op.create_index(
+            'ix_rentals_payment_status_created_at',
+            ['payment_status', 'created_at'],
+            unique=False,
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('rentals', schema=None) as batch_op:
+        batch_op.drop_index('ix_rentals_payment_status_created_at')
+        batch_op.drop_index('ix_rentals_order_status_created_at')